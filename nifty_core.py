@@ -0,0 +1,450 @@
+"""
+NIFTY-50 Alert System – core (data, signals, alerts, scheduler)
+Author: 2025
+
+Shared by the Flask web service (nifty_alerts.py); run directly for a
+scheduler-only worker.
+"""
+
+import os, json, datetime, asyncio, requests, pytz
+from collections import deque
+import httpx, orjson
+import numpy as np
+from fyers_apiv3 import fyersModel
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    # numba missing: run the kernels as plain Python (or scipy, see below)
+    HAVE_NUMBA = False
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+try:
+    import uvloop
+    _run_loop = uvloop.run
+except ImportError:
+    _run_loop = asyncio.run
+
+# =========================================================
+# --- Load configuration ---
+# =========================================================
+CFG_PATH = "config.json"
+if os.path.exists(CFG_PATH):
+    with open(CFG_PATH) as f:
+        cfg = json.load(f)
+else:
+    cfg = {}
+
+FYERS_ID       = cfg.get("client_id", os.getenv("FYERS_ID", ""))
+FYERS_SECRET   = cfg.get("secret_key", os.getenv("FYERS_SECRET", ""))
+REDIRECT_URI   = cfg.get("redirect_uri", os.getenv("REDIRECT_URI", "https://127.0.0.1/"))
+ACCESS_TOKEN   = cfg.get("access_token", os.getenv("ACCESS_TOKEN", ""))
+REFRESH_TOKEN  = cfg.get("refresh_token", os.getenv("REFRESH_TOKEN", ""))
+WHATSAPP_URL   = cfg.get("whatsapp_url", os.getenv("WHATSAPP_URL", ""))
+EMAIL_WEBHOOK  = cfg.get("email_webhook", os.getenv("EMAIL_WEBHOOK", ""))
+DEBUG_MODE     = json.loads(os.getenv("DEBUG_MODE", "true")).__bool__()
+
+SYMBOL_FYERS   = "NSE:NIFTY50-INDEX"
+INTERVAL       = "15"
+LOOKBACK       = 90
+RSI_PERIOD     = 14
+HISTORY_DAYS   = 5
+BUF_SIZE       = 256
+JOB_INTERVAL   = 15 * 60
+FETCH_TIMEOUT  = 20
+IST            = pytz.timezone("Asia/Kolkata")
+
+# Shared keep-alive session for Yahoo
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "Mozilla/5.0"})
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                       max_retries=Retry(total=2, backoff_factor=0.3))
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+_FY_CLIENT = None
+
+# =========================================================
+# --- Fyers Token Refresh ---
+# =========================================================
+async def refresh_fyers_token():
+    global ACCESS_TOKEN, REFRESH_TOKEN, _FY_CLIENT
+    try:
+        url = "https://api-t2.fyers.in/api/v3/validate-refresh-token"
+        payload = {
+            "grant_type": "refresh_token",
+            "appIdHash": FYERS_ID,
+            "refresh_token": REFRESH_TOKEN
+        }
+        async with httpx.AsyncClient(timeout=10) as client:
+            res = await client.post(url, json=payload)
+        data = orjson.loads(res.content)
+        if data.get("s") == "ok" and "access_token" in data:
+            ACCESS_TOKEN = data["access_token"]
+            REFRESH_TOKEN = data.get("refresh_token", REFRESH_TOKEN)
+            _FY_CLIENT = None
+            cfg["access_token"] = ACCESS_TOKEN
+            cfg["refresh_token"] = REFRESH_TOKEN
+            cfg["last_refresh"] = str(datetime.datetime.now())
+            json.dump(cfg, open(CFG_PATH, "w"), indent=2)
+            print("✅ Token refreshed successfully.")
+            return True
+        else:
+            print("⚠️ Token refresh failed:", data)
+            return False
+    except Exception as e:
+        print("⚠️ Error refreshing token:", e)
+        return False
+
+# =========================================================
+# --- Fetch from Fyers / Yahoo ---
+# =========================================================
+def _get_fy():
+    global _FY_CLIENT
+    if _FY_CLIENT is None:
+        _FY_CLIENT = fyersModel.FyersModel(client_id=FYERS_ID, token=ACCESS_TOKEN, log_path=".", is_async=False)
+    return _FY_CLIENT
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.5, max=4), reraise=True)
+async def _fetch_fyers(days):
+    payload = {
+        "symbol": SYMBOL_FYERS,
+        "resolution": INTERVAL,
+        "date_format": "1",
+        "range_from": (datetime.date.today() - datetime.timedelta(days=days)).strftime("%Y-%m-%d"),
+        "range_to": datetime.date.today().strftime("%Y-%m-%d"),
+        "cont_flag": "1"
+    }
+    res = await asyncio.to_thread(_get_fy().history, payload)
+    if not res or "candles" not in res:
+        if res and res.get("code") == -16:
+            print("⚠️ Token invalid; trying refresh ...")
+            await refresh_fyers_token()
+        raise ValueError(f"Unexpected response: {res}")
+    # rows are [time, open, high, low, close, volume]
+    arr = np.asarray(res["candles"], dtype=np.float64).reshape(-1, 6)
+    return arr[:, 0].astype(np.int64), arr[:, 4]
+
+async def get_data_fyers(days=HISTORY_DAYS):
+    try:
+        bars = await asyncio.wait_for(_fetch_fyers(days), timeout=FETCH_TIMEOUT)
+        print("✅ Using Fyers data")
+        return bars
+    except Exception as e:
+        print("⚠️ Fyers fetch failed:", e)
+        return None
+
+def get_data_yfinance(days=HISTORY_DAYS):
+    try:
+        url = "https://query1.finance.yahoo.com/v8/finance/chart/%5ENSEI"
+        params = {"interval": "15m", "range": "1d" if days == 0 else "5d"}
+        r = SESSION.get(url, params=params, timeout=10)
+        data = orjson.loads(r.content)
+        if "chart" not in data or not data["chart"].get("result"):
+            print("⚠️ Yahoo data invalid.")
+            return None
+        result = data["chart"]["result"][0]
+        indicators = result["indicators"]["quote"][0]
+        ts = np.asarray(result.get("timestamp", []), dtype=np.int64)
+        close = np.asarray(indicators.get("close", []), dtype=np.float64)
+        mask = ~np.isnan(close)
+        print(f"✅ Using Yahoo Finance data ({mask.sum()} bars)")
+        return ts[mask], close[mask]
+    except Exception as e:
+        print("⚠️ Yahoo fetch failed:", e)
+        return None
+
+# =========================================================
+# --- Rolling Close Buffer ---
+# =========================================================
+CLOSE_BUF  = np.empty(BUF_SIZE, np.float64)   # recent closes, oldest first
+_head      = 0                                 # number of valid closes
+_last_time = None                              # epoch seconds of the newest buffered bar
+
+def update_buffer(times, closes):
+    """Append bars newer than the buffer; the newest buffered bar may still be forming, so it is overwritten."""
+    global _head, _last_time
+    if len(times) == 0:
+        return
+    start = 0
+    if _last_time is not None:
+        start = int(np.searchsorted(times, _last_time))
+        if start < len(times) and times[start] == _last_time:
+            CLOSE_BUF[_head - 1] = closes[start]
+            start += 1
+    new = closes[start:][-BUF_SIZE:]
+    if len(new) == 0:
+        return
+    if STATE["ema5"] is not None:
+        # the previous newest bar and all but the last new bar are now closed
+        _commit(CLOSE_BUF[_head - 1])
+        for c in new[:-1]:
+            _commit(c)
+    if _head + len(new) > BUF_SIZE:
+        keep = min(_head, BUF_SIZE // 2, BUF_SIZE - len(new))
+        CLOSE_BUF[:keep] = CLOSE_BUF[_head - keep:_head]
+        _head = keep
+    CLOSE_BUF[_head:_head + len(new)] = new
+    _head += len(new)
+    _last_time = int(times[-1])
+    if STATE["ema5"] is None and _head - 1 > RSI_PERIOD:
+        _seed_state(CLOSE_BUF[:_head - 1])
+
+async def refresh_buffer():
+    """Fetch full history on first use, afterwards only the days since the newest bar."""
+    if _last_time is None:
+        days = HISTORY_DAYS
+    else:
+        days = min(HISTORY_DAYS, (datetime.date.today() - datetime.date.fromtimestamp(_last_time)).days)
+    bars = await get_data_fyers(days)
+    if bars is None:
+        bars = await asyncio.to_thread(get_data_yfinance, days)
+    if bars is None:
+        return False
+    update_buffer(*bars)
+    return True
+
+# =========================================================
+# --- Indicator Kernels ---
+# (explicit signatures: compiled at import, cached on disk)
+# =========================================================
+@njit("float64[:](float64[:], float64)", cache=True)
+def _ema_njit(x, alpha):
+    n = x.shape[0]
+    y = np.empty_like(x)
+    if n == 0:
+        return y
+    y[0] = x[0]
+    for i in range(1, n):
+        y[i] = alpha * x[i] + (1 - alpha) * y[i - 1]
+    return y
+
+@njit("UniTuple(float64, 4)(float64[:], float64[:])", cache=True)
+def _seed_kernel(close, rsi_out):
+    """
+    Single pass of EMA5, EMA21 and Wilder RSI-14 over `close`. Writes the RSI
+    series into `rsi_out` and returns the final recurrence state
+    (ema5, ema21, avg_gain, avg_loss).
+    """
+    n = close.shape[0]
+    a5 = 2.0 / 6.0
+    a21 = 2.0 / 22.0
+    period = 14
+    e5 = close[0]
+    e21 = close[0]
+    avg_gain = 0.0
+    avg_loss = 0.0
+    rsi_out[0] = np.nan
+    for i in range(1, n):
+        c = close[i]
+        e5 = a5 * c + (1 - a5) * e5
+        e21 = a21 * c + (1 - a21) * e21
+        d = c - close[i - 1]
+        gain = d if d > 0 else 0.0
+        loss = -d if d < 0 else 0.0
+        if i <= period:
+            avg_gain += gain / period
+            avg_loss += loss / period
+        else:
+            avg_gain = (avg_gain * (period - 1) + gain) / period
+            avg_loss = (avg_loss * (period - 1) + loss) / period
+        if i < period:
+            rsi_out[i] = np.nan
+        elif avg_loss == 0:
+            rsi_out[i] = 100.0
+        else:
+            rsi_out[i] = 100 - 100 / (1 + avg_gain / avg_loss)
+    return (e5, e21, avg_gain, avg_loss)
+
+if not HAVE_NUMBA:
+    try:
+        from scipy.signal import lfilter
+    except ImportError:
+        pass
+    else:
+        def _ema_njit(x, alpha):
+            # same recurrence as an IIR filter: y[i] = alpha*x[i] + (1-alpha)*y[i-1]
+            if x.shape[0] == 0:
+                return np.empty_like(x)
+            y, _ = lfilter([alpha], [1.0, alpha - 1.0], x, zi=[x[0] * (1 - alpha)])
+            return y
+
+        def _seed_kernel(close, rsi_out):
+            # Wilder smoothing is the same IIR with alpha = 1/period, seeded
+            # with the SMA of the first `period` moves
+            period = 14
+            a = 1.0 / period
+            d = np.diff(close)
+            gains = np.where(d > 0, d, 0.0)
+            losses = np.where(d < 0, -d, 0.0)
+            ag = np.full(d.shape[0], np.nan)
+            al = np.full(d.shape[0], np.nan)
+            ag[period - 1] = gains[:period].mean()
+            al[period - 1] = losses[:period].mean()
+            if d.shape[0] > period:
+                ag[period:], _ = lfilter([a], [1.0, a - 1.0], gains[period:], zi=[ag[period - 1] * (1 - a)])
+                al[period:], _ = lfilter([a], [1.0, a - 1.0], losses[period:], zi=[al[period - 1] * (1 - a)])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rsi_out[1:] = np.where(al == 0, 100.0, 100 - 100 / (1 + ag / al))
+            rsi_out[0] = np.nan
+            return (_ema_njit(close, 2.0 / 6.0)[-1], _ema_njit(close, 2.0 / 22.0)[-1], ag[-1], al[-1])
+
+def _ema_alpha(window):
+    return 2.0 / (window + 1)
+
+# =========================================================
+# --- Signal Computation ---
+# =========================================================
+# Recurrence state as of the newest *closed* bar; the forming bar is
+# evaluated on top of it each tick without being folded in.
+STATE    = {"ema5": None, "ema21": None, "ag": None, "al": None, "prev": None}
+RSI_HIST = deque(maxlen=LOOKBACK)   # RSI of the last LOOKBACK closed bars
+_last_trend = None                  # EMA5 > EMA21 at the last debug report
+
+def _seed_state(close):
+    rsi = np.empty_like(close)
+    e5, e21, ag, al = _seed_kernel(close, rsi)
+    STATE.update(ema5=e5, ema21=e21, ag=ag, al=al, prev=close[-1])
+    RSI_HIST.clear()
+    RSI_HIST.extend(rsi[-LOOKBACK:])
+
+def _step(c):
+    """One EMA/Wilder update of STATE with close `c`; returns (ema5, ema21, ag, al, rsi)."""
+    a5, a21 = _ema_alpha(5), _ema_alpha(21)
+    e5 = a5 * c + (1 - a5) * STATE["ema5"]
+    e21 = a21 * c + (1 - a21) * STATE["ema21"]
+    d = c - STATE["prev"]
+    ag = (STATE["ag"] * (RSI_PERIOD - 1) + max(d, 0.0)) / RSI_PERIOD
+    al = (STATE["al"] * (RSI_PERIOD - 1) + max(-d, 0.0)) / RSI_PERIOD
+    rsi = 100.0 if al == 0 else 100 - 100 / (1 + ag / al)
+    return e5, e21, ag, al, rsi
+
+def _commit(c):
+    e5, e21, ag, al, rsi = _step(c)
+    STATE.update(ema5=e5, ema21=e21, ag=ag, al=al, prev=c)
+    RSI_HIST.append(rsi)
+
+def compute_signals():
+    global _last_trend
+    close_last = CLOSE_BUF[_head - 1]
+    ema5_prev, ema21_prev = STATE["ema5"], STATE["ema21"]
+    ema5, ema21, _, _, rsi = _step(close_last)
+    if _head > LOOKBACK and len(RSI_HIST) == LOOKBACK:
+        close_lb, rsi_lb = CLOSE_BUF[_head - 1 - LOOKBACK], RSI_HIST[0]
+    else:
+        close_lb = rsi_lb = np.nan
+    ema_bull = ema5 > ema21 and ema5_prev <= ema21_prev
+    ema_bear = ema5 < ema21 and ema5_prev >= ema21_prev
+    bull_div = close_last < close_lb and rsi > rsi_lb
+    bear_div = close_last > close_lb and rsi < rsi_lb
+    signals = []
+    if ema_bull: signals.append("📈 EMA Bullish Cross — EMA5 > EMA21")
+    if ema_bear: signals.append("📉 EMA Bearish Cross — EMA5 < EMA21")
+    if bull_div: signals.append("🟢 Bullish RSI Divergence")
+    if bear_div: signals.append("🔴 Bearish RSI Divergence")
+    if DEBUG_MODE and (ema5 > ema21) != _last_trend:
+        _last_trend = ema5 > ema21
+        diff = ema5 - ema21
+        trend = "Bullish" if diff > 0 else "Bearish"
+        print(f"🧭 EMA Status — Close: {close_last:.2f}, EMA5: {ema5:.2f}, EMA21: {ema21:.2f}, Diff: {diff:.2f} → {trend}")
+    return signals
+
+# =========================================================
+# --- Alert Delivery ---
+# =========================================================
+async def send_alert(msg):
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    text = f"[{ts}] NIFTY50 Alert:\n{msg}"
+    print(text)
+    async with httpx.AsyncClient(timeout=10) as client:
+        calls = []
+        if WHATSAPP_URL:
+            calls.append(client.get(f"{WHATSAPP_URL}&text={requests.utils.quote(text)}"))
+        if EMAIL_WEBHOOK:
+            calls.append(client.post(EMAIL_WEBHOOK, json={"text": text}))
+        results = await asyncio.gather(*calls, return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            print("⚠️ Alert send failed:", r)
+
+# =========================================================
+# --- Scheduled Jobs ---
+# =========================================================
+async def job():
+    if not await refresh_buffer() or _head < 50 or STATE["ema5"] is None:
+        print("⚠️ No valid data fetched.")
+        return
+    signals = compute_signals()
+    if not signals:
+        print("⏸️ No new signals this cycle.")
+    for s in signals:
+        await send_alert(s)
+
+async def ema_status_alert():
+    if not await refresh_buffer() or _head < 21:
+        print("⚠️ No data for EMA status check.")
+        return
+    close = CLOSE_BUF[:_head]
+    ema5 = _ema_njit(close, _ema_alpha(5))[-1]
+    ema21 = _ema_njit(close, _ema_alpha(21))[-1]
+    cond = ">" if ema5 > ema21 else "<"
+    diff = ema5 - ema21
+    bias = "Bullish Bias" if diff > 0 else "Bearish Bias"
+    msg = (
+        f"NIFTY50 Daily EMA Summary (10 AM IST):\n"
+        f"Close: {close[-1]:.2f}\n"
+        f"EMA5: {ema5:.2f}\n"
+        f"EMA21: {ema21:.2f}\n"
+        f"➤ EMA5 {cond} EMA21 → {bias} ({diff:+.2f} pts)"
+    )
+    await send_alert(msg)
+
+# =========================================================
+# --- Scheduler ---
+# =========================================================
+async def _run_job(coro):
+    try:
+        await coro()
+    except Exception as e:
+        print(f"⚠️ {coro.__name__} failed:", e)
+
+async def every(interval, coro):
+    """Run `coro` now and then every `interval` seconds, sleeping until each deadline."""
+    loop = asyncio.get_running_loop()
+    next_run = loop.time()
+    while True:
+        await _run_job(coro)
+        next_run += interval
+        await asyncio.sleep(max(0.0, next_run - loop.time()))
+
+async def daily_at(hhmm, coro):
+    """Run `coro` every day at `hhmm` IST."""
+    hour, minute = map(int, hhmm.split(":"))
+    while True:
+        now = datetime.datetime.now(IST)
+        run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run_at <= now:
+            run_at += datetime.timedelta(days=1)
+        await asyncio.sleep((run_at - now).total_seconds())
+        await _run_job(coro)
+
+async def scheduler_main():
+    await refresh_fyers_token()
+    await asyncio.gather(
+        every(JOB_INTERVAL, job),
+        daily_at("10:00", ema_status_alert),
+    )
+
+def run_scheduler():
+    _run_loop(scheduler_main())
+
+if __name__ == "__main__":
+    print("🚀 Starting NIFTY-50 Alert System (worker mode)")
+    run_scheduler()